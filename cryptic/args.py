@@ -6,12 +6,15 @@
 # Date   : 31.10.2024
 # (c) Camille Scott, 2024
 
-from argparse import Action
+from argparse import Action, ArgumentTypeError
 from enum import Enum
 
 from ponderosa import CmdTree, ArgParser, arggroup
 
 
+_CHOICES_CACHE: dict[type[Enum], tuple[str, ...]] = {}
+
+
 class EnumAction(Action):
     """
     Argparse action for handling Enums
@@ -26,8 +29,11 @@ class EnumAction(Action):
         if not issubclass(enum, Enum):
             raise TypeError("type must be an Enum when using EnumAction")
 
-        # Generate choices from the Enum
-        kwargs.setdefault("choices", tuple(e.name for e in enum))
+        # Generate choices from the Enum, once per Enum class
+        choices = _CHOICES_CACHE.get(enum)
+        if choices is None:
+            choices = _CHOICES_CACHE[enum] = tuple(enum.__members__)
+        kwargs.setdefault("choices", choices)
 
         super(EnumAction, self).__init__(**kwargs)
 
@@ -39,4 +45,14 @@ class EnumAction(Action):
         setattr(namespace, self.dest, enum)
 
 
+def positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise ArgumentTypeError(f'{value!r} is not an integer')
+    if number < 1:
+        raise ArgumentTypeError(f'{value!r} must be at least 1')
+    return number
+
+
 commands = CmdTree()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# File   : cache.py
+# License: MIT
+# Author : Camille Scott <camille.scott.w@gmail.com>
+# Date   : 14.10.2026
+# (c) Camille Scott, 2026
+
+import os
+from pathlib import Path
+import shutil
+
+
+def cache_dir() -> Path:
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'cryptic'
+
+
+def cache_path(namespace: str, key: str, suffix: str = '.json') -> Path:
+    return cache_dir() / namespace / key[:2] / f'{key}{suffix}'
+
+
+def write_atomic(path: Path, data: bytes):
+    '''
+    Write data to a temp file beside path's real target and move it over
+    the target, so readers never see a partially written file. Symlinks
+    are followed, and an existing file keeps its permissions.
+    '''
+    target = Path(os.path.realpath(path))
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f'{target.name}.{os.getpid()}.tmp')
+    try:
+        tmp.write_bytes(data)
+        if target.exists():
+            shutil.copymode(target, tmp)
+        os.replace(tmp, target)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
@@ -6,12 +6,21 @@
 # Date   : 23.10.2024
 # (c) Camille Scott, 2024
 
-from typing import Type
+import asyncio
+from functools import lru_cache
+import hashlib
+import json
+from typing import TYPE_CHECKING, Callable, NamedTuple, Sequence, Type
 
-from openai import OpenAI
+from pydantic import ValidationError
 
+from .cache import cache_path, write_atomic
 from .models import BaseNoteSummary, NoteSummary
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+    from openai.types.chat import ParsedChatCompletion
+
 
 OPENAI_MODELS = {
     'gpt-4o',
@@ -19,17 +28,175 @@ OPENAI_MODELS = {
 }
 
 
+@lru_cache(maxsize=1)
+def get_client() -> 'OpenAI':
+    # openai (and httpx) are imported here rather than at module level
+    # so importing cryptic.chat stays cheap.
+    from openai import OpenAI
+    return OpenAI()
+
+
+def summary_messages(content: str):
+    return [
+        {"role": "system", 
+         "content": "You are an expert at structured data extraction. You will be given unstructured source from a webpage and should convert it to the given format."},
+        {"role": "user", "content": content}
+    ]
+
+
+class SummaryResult(NamedTuple):
+    summary: BaseNoteSummary | None
+    completion: 'ParsedChatCompletion'
+    cached: bool = False
+    '''True when the completion came from the on-disk cache.'''
+
+
+@lru_cache(maxsize=None)
+def schema_fingerprint(schema: Type[BaseNoteSummary]) -> str:
+    return json.dumps(schema.model_json_schema(), sort_keys=True)
+
+
+def completion_cache_key(content: str,
+                         model: str,
+                         schema: Type[BaseNoteSummary]) -> str:
+    # Hash everything that is sent, so edits to the prompt or to the
+    # schema's fields stop old answers from being served.
+    request = json.dumps([model, schema_fingerprint(schema), summary_messages(content)])
+    return hashlib.sha256(request.encode()).hexdigest()
+
+
+def load_cached_completion(key: str, schema: Type[BaseNoteSummary]):
+    from openai.types.chat import ParsedChatCompletion
+
+    try:
+        data = cache_path('completions', key).read_bytes()
+    except OSError:
+        return None
+    try:
+        return ParsedChatCompletion[schema].model_validate_json(data)
+    except ValidationError:
+        return None
+
+
+def save_cached_completion(key: str, completion: 'ParsedChatCompletion'):
+    if completion.choices[0].message.parsed is None:
+        return
+    try:
+        write_atomic(cache_path('completions', key),
+                     completion.model_dump_json().encode())
+    except OSError:
+        # The cache is only an optimization; never lose a paid response
+        # over an unwritable cache directory.
+        pass
+
+
 def summarize_page(content: str,
                    model: str = 'gpt-4o-mini',
-                   schema: Type[BaseNoteSummary] = NoteSummary):
-    client = OpenAI()
-    completion = client.beta.chat.completions.parse(
+                   schema: Type[BaseNoteSummary] = NoteSummary,
+                   client: 'OpenAI | None' = None,
+                   cache: bool = True,
+                   on_category: Callable[[str], None] | None = None):
+    key = completion_cache_key(content, model, schema)
+    if cache and (completion := load_cached_completion(key, schema)) is not None:
+        return SummaryResult(completion.choices[0].message.parsed, completion, cached=True)
+
+    if client is None:
+        client = get_client()
+    with client.beta.chat.completions.stream(
+        model=model,
+        messages=summary_messages(content),
+        response_format=schema,
+        stream_options={'include_usage': True},
+    ) as stream:
+        category = None
+        for event in stream:
+            # event.parsed is the partially parsed JSON so far; incomplete
+            # strings are left out, so category only shows up once whole.
+            if on_category is not None and category is None \
+               and event.type == 'content.delta' and isinstance(event.parsed, dict):
+                category = event.parsed.get('category')
+                if category is not None:
+                    on_category(category)
+        completion = stream.get_final_completion()
+    save_cached_completion(key, completion)
+    return SummaryResult(completion.choices[0].message.parsed, completion)
+
+
+async def summarize_page_async(content: str,
+                               model: str = 'gpt-4o-mini',
+                               schema: Type[BaseNoteSummary] = NoteSummary,
+                               client: 'AsyncOpenAI | None' = None,
+                               cache: bool = True):
+    key = completion_cache_key(content, model, schema)
+    if cache and (completion := load_cached_completion(key, schema)) is not None:
+        return SummaryResult(completion.choices[0].message.parsed, completion, cached=True)
+
+    if client is None:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI()
+    completion = await client.beta.chat.completions.parse(
         model=model,
-        messages=[
-            {"role": "system", 
-             "content": "You are an expert at structured data extraction. You will be given unstructured source from a webpage and should convert it to the given format."},
-            {"role": "user", "content": content}
-        ],
+        messages=summary_messages(content),
         response_format=schema,
     )
-    return completion.choices[0].message.parsed, completion
+    save_cached_completion(key, completion)
+    return SummaryResult(completion.choices[0].message.parsed, completion)
+
+
+async def summarize_pages_async(contents: Sequence[str],
+                                model: str = 'gpt-4o-mini',
+                                schema: Type[BaseNoteSummary] = NoteSummary,
+                                concurrency: int = 8,
+                                client: 'AsyncOpenAI | None' = None,
+                                cache: bool = True):
+    '''
+    Summarize several pages with at most `concurrency` requests in flight.
+    Returns a SummaryResult or the raised exception for each page, in
+    order. Cached pages are answered first, and a client is only
+    created if some page actually needs a request.
+    '''
+    results = [None] * len(contents)
+    misses = []
+    for i, content in enumerate(contents):
+        key = completion_cache_key(content, model, schema)
+        if cache and (completion := load_cached_completion(key, schema)) is not None:
+            results[i] = SummaryResult(completion.choices[0].message.parsed,
+                                       completion,
+                                       cached=True)
+        else:
+            misses.append(i)
+    if not misses:
+        return results
+
+    owned = client is None
+    if owned:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI()
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(content):
+        async with sem:
+            return await summarize_page_async(content,
+                                              model=model,
+                                              schema=schema,
+                                              client=client,
+                                              cache=False)
+    try:
+        fetched = await asyncio.gather(*(one(contents[i]) for i in misses),
+                                       return_exceptions=True)
+    finally:
+        if owned:
+            await client.close()
+
+    for i, result in zip(misses, fetched):
+        results[i] = result
+    return results
+
+
+def describe_failure(result) -> str:
+    if isinstance(result, BaseException):
+        return f'{type(result).__name__}: {result}'
+    choice = result[1].choices[0]
+    if choice.message.refusal:
+        return f'refused: {choice.message.refusal}'
+    return f'no summary (finish_reason={choice.finish_reason})'
@@ -9,12 +9,8 @@
 from argparse import Namespace
 from pathlib import Path
 
-from rich.console import Console
-
-from .args import ArgParser, arggroup, commands, EnumAction
-from .chat import summarize_page
+from .args import ArgParser, arggroup, commands, EnumAction, positive_int
 from .models import NoteSummary, PageCategory, summary_schema_from_category
-from .note import WebNote
 
 
 @arggroup('Category')
@@ -22,10 +18,26 @@ def category_args(parser: ArgParser):
     parser.add_argument('--category', '-c', type=PageCategory, action=EnumAction)
 
 
+def select_schema(args: Namespace, console):
+    if args.category:
+        schema = summary_schema_from_category(args.category)
+        console.log(f'[yellow] Forcing {schema} as Schema')
+    else:
+        schema = NoteSummary
+    return schema
+
+
 @category_args.apply()
 @commands.register('process', 'note',
                    help='Process a note with the LLM and rewrite it.')
 def process_note(args: Namespace):
+    # Deferred so that --help and argument errors don't pay for
+    # importing openai and rich.
+    from rich.console import Console
+
+    from .chat import summarize_page
+    from .note import WebNote
+
     console = Console(stderr=True)
     console.log(f'Load {args.note}...')
     note = WebNote(args.note)
@@ -34,19 +46,24 @@ def process_note(args: Namespace):
         console.log('[red] Note already processed and not --force, exiting.')
         return 1
 
-    if args.category:
-        schema = summary_schema_from_category(args.category)
-        console.log(f'[yellow] Forcing {schema} as Schema')
-    else:
-        schema = NoteSummary
+    schema = select_schema(args, console)
 
     with console.status(f'[bold blue]Wait for OpenAI response...') as status:
-        summary, completion = summarize_page(note.content, schema=schema)
+        def on_category(category: str):
+            status.update(f'[bold blue]Wait for OpenAI response ({category})...')
+
+        summary, completion, cached = summarize_page(note.content,
+                                                     schema=schema,
+                                                     cache=not args.no_cache,
+                                                     on_category=on_category)
         if summary is None:
             console.print(f'[red] Error processing note!')
             return 1
 
-    console.log(f'Processed note using {completion.usage.total_tokens} tokens.')
+    if cached:
+        console.log('Processed note using a cached response.')
+    else:
+        console.log(f'Processed note using {completion.usage.total_tokens} tokens.')
     console.print(summary)
 
     console.log('Update and save note...')
@@ -63,4 +80,61 @@ def process_note(args: Namespace):
 def _(parser: ArgParser):
     parser.add_argument('--note', '-i', type=Path, required=True)
     parser.add_argument('--force', '-f', default=False, action='store_true')
+    parser.add_argument('--no-cache', default=False, action='store_true',
+                        help='Always query OpenAI, ignoring cached responses.')
 
+
+@category_args.apply()
+@commands.register('process', 'notes',
+                   help='Process a directory of notes concurrently with the LLM.')
+def process_notes(args: Namespace):
+    import asyncio
+
+    from rich.console import Console
+
+    from .chat import describe_failure, summarize_pages_async
+    from .note import WebNote
+
+    console = Console(stderr=True)
+    console.log(f'Load notes from {args.notes_dir}...')
+    notes = [WebNote(path) for path in sorted(args.notes_dir.glob('*.md'))]
+    if not args.force:
+        notes = [note for note in notes if not note.cryptic_processed]
+    if not notes:
+        console.log('[red] No unprocessed notes found, exiting.')
+        return 1
+
+    schema = select_schema(args, console)
+
+    with console.status(f'[bold blue]Wait for {len(notes)} OpenAI responses...'):
+        results = asyncio.run(summarize_pages_async([note.content for note in notes],
+                                                    schema=schema,
+                                                    concurrency=args.concurrency,
+                                                    cache=not args.no_cache))
+
+    failed = 0
+    for note, result in zip(notes, results):
+        if isinstance(result, BaseException) or result[0] is None:
+            console.log(f'[red] Error processing {note.path}: {describe_failure(result)}')
+            failed += 1
+            continue
+        summary, completion, cached = result
+        note.process_summary(summary)
+        note.save()
+        if cached:
+            console.log(f'Processed {note.path} using a cached response.')
+        else:
+            console.log(f'Processed {note.path} using {completion.usage.total_tokens} tokens.')
+
+    console.rule(f'Processed {len(notes) - failed} of {len(notes)} Notes')
+
+    return 1 if failed else 0
+
+
+@process_notes.args()
+def _(parser: ArgParser):
+    parser.add_argument('--notes-dir', '-d', type=Path, required=True)
+    parser.add_argument('--concurrency', '-j', type=positive_int, default=8)
+    parser.add_argument('--force', '-f', default=False, action='store_true')
+    parser.add_argument('--no-cache', default=False, action='store_true',
+                        help='Always query OpenAI, ignoring cached responses.')
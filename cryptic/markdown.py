@@ -8,6 +8,7 @@
 
 
 from functools import singledispatch
+import io
 import textwrap
 from typing import Any
 
@@ -22,40 +23,11 @@ from .models import (NoteInfo,
                      ReferenceInfo)
 
 
-def md_escape(text: str) -> str:
-    special_characters = [
-        ('\\', '\\\\'),  
-        ('`', '\\`'),
-        ('*', '\\*'),
-        ('_', '\\_'),
-        ('{', '\\{'),
-        ('}', '\\}'),
-        ('[', '\\['),
-        (']', '\\]'),
-        ('(', '\\('),
-        (')', '\\)'),
-        ('>', '\\>'),
-        ('#', '\\#'),
-        ('+', '\\+'),
-        ('-', '\\-'),
-        ('.', '\\.'),
-        ('!', '\\!')
-    ]
-
-    for char, escape in special_characters:
-        text = text.replace(char, escape)
-
-    return text
-
+_MD_ESCAPE = str.maketrans({c: '\\' + c for c in '\\`*_{}[]()>#+-.!'})
 
-def md_bullets(source: list[Any], symbol: str = '-'):
-    for item in source:
-        yield symbol, item
 
-
-def md_enumerate(source: list[Any]):
-    for i, item in enumerate(source):
-        yield f'{i}.', item
+def md_escape(text: str) -> str:
+    return text.translate(_MD_ESCAPE)
 
 
 def md_bold(text: str):
@@ -67,13 +39,11 @@ def md_italic(text: str):
 
 
 def md_list(items: list[Any], numbered: bool = False):
-    markers = md_enumerate if numbered else md_bullets
-
-    result = []
-    for marker, item in markers(items):
-        result.append(f'{marker} {item}')
-
-    return '\n'.join(result)
+    if numbered:
+        return '\n'.join(f'{i}. {item}' for i, item in enumerate(items))
+    if not items:
+        return ''
+    return '- ' + '\n- '.join(map(str, items))
 
 
 def md_header(item: str, depth: int = 2):
@@ -88,44 +58,45 @@ def md_link(url: str, text: str | None = None):
 
 @singledispatch
 def noteinfo_to_md(info: NoteInfo) -> str:
-    elements : list[str] = [info.summary]
-    return '\n\n'.join(elements)
+    return info.summary
 
 
 @noteinfo_to_md.register
 def _(info: PaperInfo) -> str:
-    elements : list[str] = [info.summary]
-    elements.append(md_header('Abstract', depth=2))
-    elements.append(info.abstract)
-    elements.append(md_header('Foudational Work', depth=2))
-    elements.append(info.foundations)
-    elements.append(md_header('Takeaways', depth=2))
-    elements.append(md_list(info.takeaways))
-    return '\n\n'.join(elements)
+    buf = io.StringIO()
+    buf.write(info.summary)
+    buf.write('\n\n## Abstract\n\n')
+    buf.write(info.abstract)
+    buf.write('\n\n## Foudational Work\n\n')
+    buf.write(info.foundations)
+    buf.write('\n\n## Takeaways\n\n')
+    buf.write(md_list(info.takeaways))
+    return buf.getvalue()
 
 
 @noteinfo_to_md.register
 def _(info: ArticleInfo):
-    elements : list[str] = [info.summary]
-    elements.append(md_header('Foudational Work', depth=2))
-    elements.append(info.foundations)
-    elements.append(md_header('Takeaways', depth=2))
-    elements.append(md_list(info.takeaways))
-    return '\n\n'.join(elements)
+    buf = io.StringIO()
+    buf.write(info.summary)
+    buf.write('\n\n## Foudational Work\n\n')
+    buf.write(info.foundations)
+    buf.write('\n\n## Takeaways\n\n')
+    buf.write(md_list(info.takeaways))
+    return buf.getvalue()
 
 
 @noteinfo_to_md.register
 def _(info: EventInfo) -> str:
-    elements : list[str] = [info.summary]
-    return '\n\n'.join(elements)
+    return info.summary
 
 @noteinfo_to_md.register
 def _(info: DiscussionInfo) -> str:
-    elements : list[str] = [info.summary]
-    elements.append(md_header('Topic', depth=2))
-    elements.append(info.topic)
-    elements.append(md_header('Viewpoints', depth=2))
-    elements.append(md_list(info.viewpoints))
-    elements.append(md_header('Solution', depth=2))
-    elements.append(info.solution)
-    return '\n\n'.join(elements)
+    buf = io.StringIO()
+    buf.write(info.summary)
+    buf.write('\n\n## Topic\n\n')
+    buf.write(info.topic)
+    buf.write('\n\n## Viewpoints\n\n')
+    buf.write(md_list(info.viewpoints))
+    buf.write('\n\n## Solution\n\n')
+    buf.write(info.solution)
+    return buf.getvalue()
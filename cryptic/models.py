@@ -7,6 +7,7 @@
 # (c) Camille Scott, 2023
 
 from enum import Enum
+from functools import lru_cache
 from textwrap import dedent
 from typing import Literal
 
@@ -185,6 +186,7 @@ class ReferenceSummary(BaseNoteSummary):
     info: ReferenceInfo
 
 
+@lru_cache(maxsize=None)
 def summary_schema_from_category(category: PageCategory):
     for subschema in BaseNoteSummary.__subclasses__():
         if subschema is NoteSummary:
@@ -6,14 +6,18 @@
 # Date   : 23.10.2024
 # (c) Camille Scott, 2024
 
-from functools import singledispatchmethod
+import hashlib
+import os
 from pathlib import Path
+import pickle
 import re
+import sys
+from typing import TYPE_CHECKING, Iterable
 
 import frontmatter as fm
-from rich.console import Console
-from rich.markdown import Markdown
+from frontmatter.default_handlers import BaseHandler
 
+from .cache import cache_path, write_atomic
 from .markdown import noteinfo_to_md
 
 from .models import (BaseNoteSummary,
@@ -21,7 +25,6 @@ from .models import (BaseNoteSummary,
                      PageCategory,
                      NoteInfo,
                      PaperInfo,
-                     ArticleInfo,
                      EventInfo,
                      ProductInfo,
                      DiscussionInfo,
@@ -29,43 +32,151 @@ from .models import (BaseNoteSummary,
                      SoftwareInfo,
                      ReferenceInfo)
 
+if TYPE_CHECKING:
+    from rich.console import Console
+
+
+# Used to render notes that had no frontmatter, as fm.dumps does.
+_YAML_HANDLER = fm.YAMLHandler()
+
+
+_TAG_RE = re.compile(r'[^\w]+')
+_TAG_TRANS = str.maketrans({c: '-' for c in map(chr, range(128))
+                            if not (c.isalnum() or c == '_')})
+
 
 def normalize_tag(tag: str):
-    return re.sub(r'[^\w]+', '-', tag).strip('-').lower()
+    if not tag.isascii():
+        return sys.intern(_TAG_RE.sub('-', tag).strip('-').lower())
+
+    # ASCII fast path: map non-word characters to '-' in one pass,
+    # then collapse the runs the regex would have merged.
+    tag = tag.translate(_TAG_TRANS)
+    while '--' in tag:
+        tag = tag.replace('--', '-')
+    return sys.intern(tag.strip('-').lower())
+
+
+def _blake2b_128():
+    return hashlib.blake2b(digest_size=16)
+
+
+def _shared_handler(handler_type: type[BaseHandler] | None) -> BaseHandler | None:
+    if handler_type is None:
+        return None
+    for handler in fm.handlers:
+        if type(handler) is handler_type:
+            return handler
+    return handler_type()
+
+
+def _load_cached(path: str, encoding: str, handler: BaseHandler | None):
+    '''
+    Load (handler, content, metadata) for the note at path, reusing the
+    parse from a previous run when the file's contents haven't changed.
+    With no handler, frontmatter detects the format (YAML, JSON, TOML)
+    and the detected handler is returned.
+
+    There is one entry per (path, encoding, handler), overwritten in place.
+    It records the file's mtime and size and a BLAKE2b digest of its
+    contents; the contents are only hashed when the stat fields match,
+    since mtime and size alone can survive a rewrite (e.g. checkouts that
+    restore mtimes).
+    '''
+    stat = os.stat(path)
+    key = hashlib.blake2b(
+        f'{os.path.realpath(path)}|{encoding}|{type(handler).__name__}'.encode(),
+        digest_size=16
+    ).hexdigest()
+    cache_file = cache_path('notes', key, '.pkl')
+    try:
+        with cache_file.open('rb') as fp:
+            mtime_ns, size, digest, handler_type, content, metadata = pickle.load(fp)
+    except (OSError, EOFError, pickle.UnpicklingError, TypeError, ValueError):
+        pass
+    else:
+        if (mtime_ns, size) == (stat.st_mtime_ns, stat.st_size):
+            with open(path, 'rb') as fp:
+                current = hashlib.file_digest(fp, _blake2b_128).hexdigest()
+            if current == digest:
+                return handler or _shared_handler(handler_type), content, metadata
+
+    with open(path, 'rb') as fp:
+        raw = fp.read()
+    base = fm.loads(raw.decode(encoding), handler=handler)
+    entry = (stat.st_mtime_ns,
+             stat.st_size,
+             hashlib.blake2b(raw, digest_size=16).hexdigest(),
+             None if base.handler is None else type(base.handler),
+             base.content,
+             base.metadata)
+    try:
+        write_atomic(cache_file, pickle.dumps(entry, protocol=5))
+    except OSError:
+        # An unwritable cache shouldn't keep us from reading notes.
+        pass
+    return base.handler, base.content, base.metadata
 
 
 class Note(fm.Post):
 
+    # fm.Post has no __slots__, so instances keep a __dict__ for its
+    # attributes; ours get slot descriptors.
+    __slots__ = ('path', '_rendered_meta')
+
     def __init__(self,
                  path: Path | str,
                  encoding: str = "utf-8",
                  handler  = None,
                  **defaults: object):
         if isinstance(path, str):
-            path = Path(path)
-        self.path = path
-        
-        base = fm.load(str(path), encoding=encoding, handler=handler, **defaults)
-        if 'tags' in base.metadata:
-            base.metadata['tags'] = list(set(base.metadata['tags']))
+            path_str, self.path = path, Path(path)
         else:
-            base.metadata['tags'] = list()
-
-        super().__init__(base.content, base.handler, **base.metadata)
+            path_str, self.path = str(path), path
+
+        handler, content, loaded = _load_cached(path_str, encoding, handler)
+        metadata = {**defaults, **loaded}
+        tags = metadata.get('tags')
+        if tags:
+            # Dedupe preserving order, as in normalize_tags/add_tags.
+            deduped = list(dict.fromkeys(tags))
+            if len(deduped) != len(tags):
+                metadata['tags'] = deduped
+        else:
+            metadata['tags'] = list()
+
+        super().__init__(content, handler, **metadata)
+
+    @classmethod
+    def load_many(cls,
+                  paths: Iterable[Path | str],
+                  max_workers: int | None = None,
+                  chunksize: int = 16):
+        '''
+        Load notes in parallel worker processes, preserving the order
+        of paths. Worker startup and pickling notes back cost more than
+        loading a cached note, so this only pays off for large batches
+        of uncached notes.
+        '''
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(cls, map(str, paths), chunksize=chunksize))
 
     def save(self):
-        with self.path.open('w') as fp:
-            print(fm.dumps(self), file=fp)
+        write_atomic(self.path, (fm.dumps(self) + '\n').encode('utf-8'))
+
+    # Tags are deduped with dict.fromkeys rather than set so their order,
+    # and therefore the saved frontmatter, is stable across runs.
 
     def normalize_tags(self):
-        tags = list({normalize_tag(tag) for \
-                     tag in self.metadata.get('tags', list())})
-        self.metadata['tags'] = tags
+        self['tags'] = list(dict.fromkeys(map(normalize_tag,
+                                              self.metadata.get('tags') or ())))
 
     def add_tags(self, other_tags):
-        tags = set(self.metadata['tags'])
-        tags.update({normalize_tag(tag) for tag in other_tags})
-        self.metadata['tags'] = list(tags)
+        tags = dict.fromkeys(self.metadata.get('tags') or ())
+        tags.update(dict.fromkeys(map(normalize_tag, other_tags)))
+        self['tags'] = list(tags)
 
     @property
     def title(self):
@@ -73,7 +184,7 @@ class Note(fm.Post):
 
     @title.setter
     def title(self, new_title: str):
-        self.metadata['title'] = new_title
+        self['title'] = new_title
 
     @property
     def cryptic_processed(self):
@@ -81,27 +192,55 @@ class Note(fm.Post):
 
     @cryptic_processed.setter
     def cryptic_processed(self, value: bool):
-        self.metadata['cryptic_processed'] = value
+        self['cryptic_processed'] = value
+
+    def rendered_metadata(self) -> str:
+        '''
+        The metadata exported by the note's handler. The export is cached
+        alongside the repr of the metadata it was made from; repr is far
+        cheaper than the export, and it sees every edit, including ones
+        made directly on .metadata or inside nested values.
+        '''
+        handler = self.handler or _YAML_HANDLER
+        fingerprint = repr(self.metadata)
+        cached = getattr(self, '_rendered_meta', None)
+        if cached is not None and cached[0] is handler and cached[1] == fingerprint:
+            return cached[2]
+        rendered = handler.export(self.metadata)
+        self._rendered_meta = (handler, fingerprint, rendered)
+        return rendered
+
+    def to_console(self, console: 'Console'):
+        from rich.markdown import Markdown
 
-    def to_console(self, console: Console):
         console.print('---')
-        console.print(fm.YAMLHandler().export(self.metadata))
+        console.print(self.rendered_metadata())
         console.print('---')
         console.print(Markdown(self.content))
 
 
 class WebNote(Note):
 
+    __slots__ = ('_category_cached',)
+
     @property
     def category(self):
-        category = self.metadata.get('category', None)
-        if category is not None:
-            return PageCategory[category]
-        return None
+        raw = self.metadata.get('category', None)
+        if raw is None:
+            return None
+        # Remember the last (raw value, enum) pair; metadata can be
+        # edited directly, so the raw value is always rechecked.
+        cached_raw, cached = getattr(self, '_category_cached', (None, None))
+        if cached_raw == raw:
+            return cached
+        category = PageCategory[raw]
+        self._category_cached = (raw, category)
+        return category
 
     @category.setter
     def category(self, category: PageCategory):
-        self.metadata['category'] = category.value
+        self['category'] = category.value
+        self._category_cached = (category.value, category)
 
 
     def process_summary(self, summary: BaseNoteSummary):
@@ -113,40 +252,64 @@ class WebNote(Note):
         self.process_info(summary.info)
         self.cryptic_processed = True
 
-    @singledispatchmethod
     def process_info(self, info: NoteInfo):
-        pass
-
-    @process_info.register
-    def _(self, info: PaperInfo):
-        self.title = info.title
-        self['aliases'][0] = info.title
-        self['author'] = info.authors
-        self['journal'] = info.journal
-        self['doi'] = info.doi
-
-    @process_info.register
-    def _(self, info: ArticleInfo):
-        pass
-
-    @process_info.register
-    def _(self, info: EventInfo):
-        self['start_date'] = info.start_date
-        self['end_date'] = info.end_date
-
-    @process_info.register
-    def _(self, info: ProductInfo):
-        self.title = info.name
-        self['aliases'][0] = info.name
-        self['price'] = info.price
-
-    @process_info.register
-    def _(self, info: MediaInfo):
-        self['media_type'] = info.media_type.value
-        self['artist'] = info.artist
-
-    @process_info.register
-    def _(self, info: SoftwareInfo):
-        self['prog_lang'] = info.language.lower()
-        self['author'] = info.authors
-
+        handler = self._INFO_DISPATCH.get(type(info))
+        if handler is not None:
+            handler(self, info)
+
+    @classmethod
+    def register_info_handler(cls, info_type: type, handler):
+        # Rebind rather than mutate, so registering on a subclass
+        # doesn't leak into its parents.
+        cls._INFO_DISPATCH = {**cls._INFO_DISPATCH, info_type: handler}
+
+    def _set_primary_alias(self, alias: str):
+        aliases = self.metadata.get('aliases')
+        if aliases:
+            aliases[0] = alias
+        else:
+            self.metadata['aliases'] = [alias]
+
+    def _process_paper(self, info: PaperInfo):
+        self.metadata.update({
+            'title': info.title,
+            'author': info.authors,
+            'journal': info.journal,
+            'doi': info.doi,
+        })
+        self._set_primary_alias(info.title)
+
+    def _process_event(self, info: EventInfo):
+        self.metadata.update({
+            'start_date': info.start_date,
+            'end_date': info.end_date,
+        })
+
+    def _process_product(self, info: ProductInfo):
+        self.metadata.update({
+            'title': info.name,
+            'price': info.price,
+        })
+        self._set_primary_alias(info.name)
+
+    def _process_media(self, info: MediaInfo):
+        self.metadata.update({
+            'media_type': info.media_type.value,
+            'artist': info.artist,
+        })
+
+    def _process_software(self, info: SoftwareInfo):
+        self.metadata.update({
+            'prog_lang': info.language.lower(),
+            'author': info.authors,
+        })
+
+    # Keyed on the exact info type; types without an entry (ArticleInfo,
+    # DiscussionInfo, ReferenceInfo) leave the metadata untouched.
+    _INFO_DISPATCH = {
+        PaperInfo: _process_paper,
+        EventInfo: _process_event,
+        ProductInfo: _process_product,
+        MediaInfo: _process_media,
+        SoftwareInfo: _process_software,
+    }
@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    '''
+    Point cryptic's on-disk caches at a per-test directory.
+    '''
+    path = tmp_path / 'cache'
+    monkeypatch.setenv('XDG_CACHE_HOME', str(path))
+    return path
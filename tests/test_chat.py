@@ -0,0 +1,299 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+openai = pytest.importorskip('openai')
+
+from cryptic.cache import cache_path
+from cryptic.chat import (completion_cache_key,
+                          describe_failure,
+                          load_cached_completion,
+                          save_cached_completion,
+                          summarize_page,
+                          summarize_page_async,
+                          summarize_pages_async)
+from cryptic.models import CrypticModel, NoteSummary, ReferenceInfo, ReferenceSummary
+
+
+def make_completion(schema=NoteSummary,
+                    summary='A summary.',
+                    refused: str | None = None,
+                    finish_reason='stop'):
+    from openai.types.chat import ParsedChatCompletion
+
+    parsed = None
+    if not refused and finish_reason == 'stop':
+        parsed = {'tags': ['tag'],
+                  'info': {'category': 'reference', 'summary': summary}}
+        if schema is NoteSummary:
+            parsed['category'] = 'reference'
+    return ParsedChatCompletion[schema].model_validate({
+        'id': 'chatcmpl-test',
+        'object': 'chat.completion',
+        'created': 0,
+        'model': 'gpt-4o-mini',
+        'choices': [{
+            'index': 0,
+            'finish_reason': finish_reason,
+            'message': {'role': 'assistant',
+                        'content': None if refused else '{}',
+                        'refusal': refused,
+                        'parsed': parsed},
+        }],
+        'usage': {'prompt_tokens': 1, 'completion_tokens': 2, 'total_tokens': 3},
+    })
+
+
+class ExplodingClient:
+
+    def __getattr__(self, name):
+        raise AssertionError('client used on a cache hit')
+
+
+def test_cache_key_depends_on_model_schema_and_content():
+    key = completion_cache_key('page', 'gpt-4o-mini', NoteSummary)
+    assert key == completion_cache_key('page', 'gpt-4o-mini', NoteSummary)
+    assert key != completion_cache_key('page', 'gpt-4o', NoteSummary)
+    assert key != completion_cache_key('page', 'gpt-4o-mini', ReferenceSummary)
+    assert key != completion_cache_key('other page', 'gpt-4o-mini', NoteSummary)
+
+
+def test_cache_key_covers_prompt_and_schema_fields(monkeypatch):
+    from cryptic import chat
+
+    key = completion_cache_key('page', 'gpt-4o-mini', ReferenceSummary)
+
+    # Not a BaseNoteSummary subclass, so summary_schema_from_category
+    # never sees it.
+    class Changed(CrypticModel):
+        tags: list[str]
+        info: ReferenceInfo
+        extra: str
+    Changed.__name__ = ReferenceSummary.__name__
+    assert key != completion_cache_key('page', 'gpt-4o-mini', Changed)
+
+    messages = chat.summary_messages
+    monkeypatch.setattr(chat, 'summary_messages',
+                        lambda content: [{'role': 'system', 'content': 'New prompt.'},
+                                         *messages(content)[1:]])
+    assert key != completion_cache_key('page', 'gpt-4o-mini', ReferenceSummary)
+
+
+def test_completion_round_trip():
+    key = completion_cache_key('page', 'gpt-4o-mini', NoteSummary)
+    assert load_cached_completion(key, NoteSummary) is None
+
+    completion = make_completion()
+    save_cached_completion(key, completion)
+    cached = load_cached_completion(key, NoteSummary)
+
+    assert cached == completion
+    assert isinstance(cached.choices[0].message.parsed, NoteSummary)
+
+
+def test_summarize_page_hit_skips_client():
+    key = completion_cache_key('page', 'gpt-4o-mini', NoteSummary)
+    completion = make_completion()
+    save_cached_completion(key, completion)
+
+    result = summarize_page('page', client=ExplodingClient())
+
+    assert result.summary == completion.choices[0].message.parsed
+    assert result.completion.usage.total_tokens == 3
+    assert result.cached
+
+
+def test_corrupt_entry_is_a_miss():
+    key = completion_cache_key('page', 'gpt-4o-mini', NoteSummary)
+    path = cache_path('completions', key)
+    path.parent.mkdir(parents=True)
+    path.write_text('{"id": "truncated')
+
+    assert load_cached_completion(key, NoteSummary) is None
+
+
+def test_unwritable_cache_is_ignored(cache_home):
+    # A file where the cache directory should be makes every mkdir fail.
+    cache_home.parent.mkdir(parents=True, exist_ok=True)
+    cache_home.write_text('')
+    key = completion_cache_key('page', 'gpt-4o-mini', NoteSummary)
+
+    save_cached_completion(key, make_completion())
+
+    assert load_cached_completion(key, NoteSummary) is None
+
+
+class FakeAsyncClient:
+    '''
+    Stands in for AsyncOpenAI: parse() answers from `responses`, keyed by
+    the user message, and records calls and peak concurrency.
+    '''
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+        self.closed = False
+        self.beta = SimpleNamespace(chat=SimpleNamespace(
+            completions=SimpleNamespace(parse=self.parse)))
+
+    async def parse(self, **kwargs):
+        self.calls.append(kwargs)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            response = self.responses[kwargs['messages'][-1]['content']]
+            if isinstance(response, BaseException):
+                raise response
+            return response
+        finally:
+            self.in_flight -= 1
+
+    async def close(self):
+        self.closed = True
+
+
+def no_client(*args, **kwargs):
+    raise AssertionError('AsyncOpenAI created')
+
+
+def test_summarize_page_async_caches():
+    completion = make_completion()
+    client = FakeAsyncClient({'page': completion})
+
+    fetched = asyncio.run(summarize_page_async('page', client=client))
+    assert fetched.completion == completion
+    assert not fetched.cached
+    assert len(client.calls) == 1
+
+    cached = asyncio.run(summarize_page_async('page', client=client))
+    assert cached.completion == completion
+    assert cached.cached
+    assert len(client.calls) == 1
+
+
+def test_summarize_pages_all_cached_needs_no_client(monkeypatch):
+    for page in ('a', 'b'):
+        save_cached_completion(completion_cache_key(page, 'gpt-4o-mini', NoteSummary),
+                               make_completion(summary=page))
+    monkeypatch.setattr(openai, 'AsyncOpenAI', no_client)
+
+    results = asyncio.run(summarize_pages_async(['b', 'a']))
+
+    assert [result.summary.info.summary for result in results] == ['b', 'a']
+    assert all(result.cached for result in results)
+
+
+def test_summarize_pages_mixes_hits_misses_and_errors(monkeypatch):
+    save_cached_completion(completion_cache_key('cached', 'gpt-4o-mini', NoteSummary),
+                           make_completion(summary='cached'))
+    error = RuntimeError('boom')
+    client = FakeAsyncClient({
+        **{f'page{i}': make_completion(summary=f'page{i}') for i in range(5)},
+        'bad': error,
+    })
+    monkeypatch.setattr(openai, 'AsyncOpenAI', lambda: client)
+    pages = ['page0', 'cached', 'bad', 'page1', 'page2', 'page3', 'page4']
+
+    results = asyncio.run(summarize_pages_async(pages, concurrency=2))
+
+    assert results[2] is error
+    assert [results[i].summary.info.summary for i in (0, 1, 3, 4, 5, 6)] == \
+           ['page0', 'cached', 'page1', 'page2', 'page3', 'page4']
+    assert [results[i].cached for i in (0, 1, 3)] == [False, True, False]
+    assert len(client.calls) == 6
+    assert client.peak == 2
+    assert client.closed
+
+
+def test_summarize_pages_leaves_passed_client_open():
+    client = FakeAsyncClient({'page': make_completion()})
+
+    asyncio.run(summarize_pages_async(['page'], client=client))
+
+    assert not client.closed
+
+
+def test_describe_failure():
+    assert describe_failure(RuntimeError('boom')) == 'RuntimeError: boom'
+    refused = make_completion(refused='no thanks')
+    assert describe_failure((None, refused)) == 'refused: no thanks'
+    truncated = make_completion(finish_reason='length')
+    assert describe_failure((None, truncated)) == 'no summary (finish_reason=length)'
+
+
+class FakeStream:
+
+    def __init__(self, events, completion):
+        self.events = events
+        self.completion = completion
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def get_final_completion(self):
+        return self.completion
+
+
+class FakeStreamingClient:
+
+    def __init__(self, events, completion):
+        self.calls = []
+        self.stream_ = FakeStream(events, completion)
+        self.beta = SimpleNamespace(chat=SimpleNamespace(
+            completions=SimpleNamespace(stream=self.stream)))
+
+    def stream(self, **kwargs):
+        self.calls.append(kwargs)
+        return self.stream_
+
+
+def delta(parsed):
+    return SimpleNamespace(type='content.delta', parsed=parsed)
+
+
+def test_summarize_page_streams():
+    completion = make_completion()
+    events = [
+        SimpleNamespace(type='chunk', parsed=None),
+        delta(None),
+        delta({}),
+        delta({'tags': ['tag']}),
+        delta({'tags': ['tag'], 'category': 'reference'}),
+        delta({'tags': ['tag'], 'category': 'reference', 'info': {}}),
+        SimpleNamespace(type='content.done', parsed={'category': 'reference'}),
+    ]
+    client = FakeStreamingClient(events, completion)
+    categories = []
+
+    result = summarize_page('page', client=client, on_category=categories.append)
+
+    assert categories == ['reference']
+    call, = client.calls
+    assert call['stream_options'] == {'include_usage': True}
+    assert call['response_format'] is NoteSummary
+    assert call['messages'][-1] == {'role': 'user', 'content': 'page'}
+    assert result == (completion.choices[0].message.parsed, completion, False)
+
+    key = completion_cache_key('page', 'gpt-4o-mini', NoteSummary)
+    assert load_cached_completion(key, NoteSummary) == completion
+
+
+def test_summarize_page_stream_failure_not_cached():
+    completion = make_completion(refused='no thanks')
+    client = FakeStreamingClient([delta({})], completion)
+
+    result = summarize_page('page', client=client, on_category=pytest.fail)
+
+    assert result.summary is None
+    key = completion_cache_key('page', 'gpt-4o-mini', NoteSummary)
+    assert load_cached_completion(key, NoteSummary) is None
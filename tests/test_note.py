@@ -0,0 +1,349 @@
+import os
+import pickle
+import random
+import re
+
+import frontmatter as fm
+import pytest
+
+from cryptic.models import (ArticleInfo,
+                            DiscussionInfo,
+                            EventInfo,
+                            MediaInfo,
+                            PaperInfo,
+                            ProductInfo,
+                            ReferenceInfo,
+                            SoftwareInfo)
+from cryptic.note import Note, WebNote, normalize_tag
+
+
+def regex_normalize_tag(tag: str):
+    return re.sub(r'[^\w]+', '-', tag).strip('-').lower()
+
+
+@pytest.mark.parametrize('tag, expected', [
+    ('Machine Learning', 'machine-learning'),
+    ('--C++ / Rust--', 'c-rust'),
+    ('snake_case', 'snake_case'),
+    ('a -- b', 'a-b'),
+    ('Über Straße', 'über-straße'),
+    ('', ''),
+    ('!!!', ''),
+])
+def test_normalize_tag(tag, expected):
+    assert normalize_tag(tag) == expected
+
+
+def test_normalize_tag_matches_regex():
+    rng = random.Random(0)
+    alphabet = ''.join(map(chr, range(128))) + 'éüß漢–'
+    for _ in range(20000):
+        tag = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+        assert normalize_tag(tag) == regex_normalize_tag(tag), repr(tag)
+
+
+def write_note(path, frontmatter='title: x\ntags: [a]', content='body'):
+    path.write_text(f'---\n{frontmatter}\n---\n{content}\n', encoding='utf-8')
+    return path
+
+
+def test_save_follows_symlinks(tmp_path):
+    target = write_note(tmp_path / 'target.md')
+    link = tmp_path / 'link.md'
+    link.symlink_to(target)
+
+    note = Note(link)
+    note.title = 'updated'
+    note.save()
+
+    assert link.is_symlink()
+    assert Note(target).title == 'updated'
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_save_keeps_file_mode(tmp_path):
+    path = write_note(tmp_path / 'note.md')
+    path.chmod(0o600)
+
+    note = Note(path)
+    note.title = 'updated'
+    note.save()
+
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert Note(path).title == 'updated'
+
+
+def test_tag_order_is_stable(tmp_path):
+    path = write_note(tmp_path / 'note.md', frontmatter='tags: [zeta, alpha, zeta]')
+
+    note = Note(path)
+    assert note.metadata['tags'] == ['zeta', 'alpha']
+
+    note.add_tags(['New Tag', 'alpha', 'Beta'])
+    assert note.metadata['tags'] == ['zeta', 'alpha', 'new-tag', 'beta']
+
+    note.metadata['tags'] = ['B', 'a', 'b']
+    note.normalize_tags()
+    assert note.metadata['tags'] == ['b', 'a']
+
+
+def cache_entries(cache_home):
+    return list((cache_home / 'cryptic' / 'notes').glob('*/*.pkl'))
+
+
+@pytest.fixture
+def count_parses(monkeypatch):
+    calls = []
+    loads = fm.loads
+
+    def counting_loads(*args, **kwargs):
+        calls.append(args)
+        return loads(*args, **kwargs)
+
+    monkeypatch.setattr(fm, 'loads', counting_loads)
+    return calls
+
+
+def test_cache_hit_skips_parse(tmp_path, count_parses):
+    path = write_note(tmp_path / 'note.md')
+
+    assert Note(path).title == 'x'
+    assert Note(path).title == 'x'
+    assert len(count_parses) == 1
+
+
+def test_cache_same_stat_changed_contents(tmp_path, count_parses):
+    path = write_note(tmp_path / 'note.md', frontmatter='title: aaa')
+    stat = path.stat()
+    assert Note(path).title == 'aaa'
+
+    # Same size, with the mtime restored: only the digest can tell.
+    write_note(path, frontmatter='title: bbb')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert path.stat().st_mtime_ns == stat.st_mtime_ns
+
+    assert Note(path).title == 'bbb'
+    assert len(count_parses) == 2
+
+
+def test_cache_corrupt_entry(tmp_path, cache_home):
+    path = write_note(tmp_path / 'note.md')
+    Note(path)
+    entry, = cache_entries(cache_home)
+    entry.write_bytes(b'not a pickle')
+
+    assert Note(path).title == 'x'
+    assert Note(path).title == 'x'
+
+
+def test_cache_keyed_on_encoding(tmp_path):
+    path = write_note(tmp_path / 'note.md', frontmatter='title: café')
+
+    assert Note(path).title == 'café'
+    assert Note(path, encoding='latin-1').title == 'cafÃ©'
+    assert Note(path).title == 'café'
+
+
+def test_cache_one_entry_per_note(tmp_path, cache_home):
+    path = write_note(tmp_path / 'note.md')
+    note = Note(path)
+    for title in ('one', 'two', 'three'):
+        note.title = title
+        note.save()
+        note = Note(path)
+        assert note.title == title
+
+    assert len(cache_entries(cache_home)) == 1
+
+
+JSON_NOTE = '{\n    "title": "j",\n    "tags": ["a"]\n}\n\nbody\n'
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_json_frontmatter(tmp_path, cached):
+    path = tmp_path / 'note.md'
+    path.write_text(JSON_NOTE, encoding='utf-8')
+    if cached:
+        Note(path)
+
+    note = Note(path)
+
+    assert note.metadata == {'title': 'j', 'tags': ['a']}
+    assert note.content == 'body'
+    assert isinstance(note.handler, fm.JSONHandler)
+
+    note.title = 'k'
+    note.save()
+    text = path.read_text(encoding='utf-8')
+    assert text.startswith('{\n') and '---' not in text
+    assert Note(path).metadata == {'title': 'k', 'tags': ['a']}
+
+
+def test_toml_frontmatter(tmp_path):
+    pytest.importorskip('toml')
+    path = tmp_path / 'note.md'
+    path.write_text('+++\ntitle = "t"\ntags = ["a"]\n+++\n\nbody\n', encoding='utf-8')
+
+    note = Note(path)
+
+    assert note.metadata == {'title': 't', 'tags': ['a']}
+    assert isinstance(note.handler, fm.TOMLHandler)
+
+
+def test_yaml_uses_shared_handler(tmp_path):
+    path = write_note(tmp_path / 'note.md')
+
+    assert Note(path).handler is Note(path).handler
+
+
+def test_no_frontmatter(tmp_path):
+    path = tmp_path / 'note.md'
+    path.write_text('just a body\n', encoding='utf-8')
+
+    note = Note(path)
+
+    assert note.metadata == {'tags': []}
+    assert note.content == 'just a body'
+    assert note.rendered_metadata() == 'tags: []'
+
+
+def test_explicit_handler_is_kept(tmp_path):
+    path = write_note(tmp_path / 'note.md')
+    handler = fm.YAMLHandler()
+
+    assert Note(path, handler=handler).handler is handler
+    assert Note(path, handler=handler).handler is handler
+
+
+def test_load_many(tmp_path):
+    paths = [write_note(tmp_path / f'{i:02}.md',
+                        frontmatter=f'title: n{i}\ncategory: paper\n')
+             for i in range(20)]
+
+    notes = WebNote.load_many(paths, max_workers=2, chunksize=3)
+
+    assert [type(note) for note in notes] == [WebNote] * len(paths)
+    assert [note.path for note in notes] == paths
+    assert [note.title for note in notes] == [f'n{i}' for i in range(20)]
+    assert all(note.category.value == 'paper' for note in notes)
+
+
+def test_pickle_keeps_slots(tmp_path):
+    note = WebNote(write_note(tmp_path / 'note.md', frontmatter='category: paper'))
+    note.category
+    note.rendered_metadata()
+
+    copy = pickle.loads(pickle.dumps(note))
+
+    assert copy.path == note.path
+    assert copy._category_cached == note._category_cached
+    assert copy.rendered_metadata() == note.rendered_metadata()
+    assert copy.metadata == note.metadata
+
+
+INFOS = [
+    (PaperInfo(category='paper', summary='s', title='A Paper', authors=['a', 'b'],
+               journal='J', abstract='abs', doi='10.1/x', takeaways=[], foundations=''),
+     {'title': 'A Paper', 'author': ['a', 'b'], 'journal': 'J', 'doi': '10.1/x',
+      'aliases': ['A Paper']}),
+    (EventInfo(category='event', summary='s', start_date='2024-01-01',
+               end_date='2024-01-02'),
+     {'start_date': '2024-01-01', 'end_date': '2024-01-02'}),
+    (ProductInfo(category='product', summary='s', name='Widget', price='$5'),
+     {'title': 'Widget', 'price': '$5', 'aliases': ['Widget']}),
+    (MediaInfo(category='media', summary='s', artist='Someone', media_type='music'),
+     {'media_type': 'music', 'artist': 'Someone'}),
+    (SoftwareInfo(category='software', summary='s', language='Python',
+                  authors=['c']),
+     {'prog_lang': 'python', 'author': ['c']}),
+]
+
+
+@pytest.fixture
+def web_note(tmp_path):
+    return WebNote(write_note(tmp_path / 'note.md'))
+
+
+@pytest.mark.parametrize('info, expected', INFOS,
+                         ids=[type(info).__name__ for info, _ in INFOS])
+def test_process_info(web_note, info, expected):
+    before = dict(web_note.metadata)
+
+    web_note.process_info(info)
+
+    assert web_note.metadata == {**before, **expected}
+
+
+@pytest.mark.parametrize('info', [
+    ArticleInfo(category='article', summary='s', takeaways=[], foundations=''),
+    DiscussionInfo(category='discussion', summary='s', topic='t', viewpoints=[],
+                   solution=''),
+    ReferenceInfo(category='reference', summary='s'),
+], ids=lambda info: type(info).__name__)
+def test_process_info_without_handler(web_note, info):
+    before = dict(web_note.metadata)
+    rendered = web_note.rendered_metadata()
+
+    web_note.process_info(info)
+
+    assert web_note.metadata == before
+    assert web_note.rendered_metadata() == rendered
+
+
+def test_register_info_handler_on_subclass(web_note):
+    def process_article(note, info):
+        note.metadata['article'] = True
+
+    class ArticleNote(WebNote):
+        __slots__ = ()
+
+    ArticleNote.register_info_handler(ArticleInfo, process_article)
+    article = ArticleInfo(category='article', summary='s', takeaways=[], foundations='')
+
+    assert ArticleNote._INFO_DISPATCH[ArticleInfo] is process_article
+    assert ArticleInfo not in WebNote._INFO_DISPATCH
+
+    note = ArticleNote(web_note.path)
+    note.process_info(article)
+    web_note.process_info(article)
+    assert note.metadata['article'] is True
+    assert 'article' not in web_note.metadata
+
+
+def test_rendered_metadata_cached(tmp_path):
+    note = Note(write_note(tmp_path / 'note.md'))
+
+    assert note.rendered_metadata() is note.rendered_metadata()
+
+
+@pytest.mark.parametrize('edit', [
+    lambda note: note.__setitem__('title', 'y'),
+    lambda note: note.__delitem__('title'),
+    lambda note: note.metadata.__setitem__('title', 'y'),
+    lambda note: note['tags'].append('b'),
+    lambda note: setattr(note, 'metadata', {'title': 'y'}),
+], ids=['setitem', 'delitem', 'metadata', 'nested', 'replaced'])
+def test_rendered_metadata_sees_edits(tmp_path, edit):
+    note = Note(write_note(tmp_path / 'note.md'))
+    note.rendered_metadata()
+
+    edit(note)
+
+    assert note.rendered_metadata() == fm.YAMLHandler().export(note.metadata)
+
+
+@pytest.mark.parametrize('info', [INFOS[0][0], INFOS[2][0]],
+                         ids=['paper', 'product'])
+@pytest.mark.parametrize('aliases, expected', [
+    (None, ['{}']),
+    ('[]', ['{}']),
+    ('[old, other]', ['{}', 'other']),
+], ids=['missing', 'empty', 'existing'])
+def test_primary_alias(tmp_path, info, aliases, expected):
+    frontmatter = 'title: x' if aliases is None else f'title: x\naliases: {aliases}'
+    note = WebNote(write_note(tmp_path / 'note.md', frontmatter=frontmatter))
+    name = getattr(info, 'title', None) or info.name
+
+    note.process_info(info)
+
+    assert note['aliases'] == [alias.format(name) for alias in expected]